@@ -3,7 +3,7 @@
 try:
     # try C library _cbor.so
     from ._cbor import loads, dumps, load, dump
-except:
+except ImportError:
     # fall back to 100% python implementation
     from .cbor import loads, dumps, load, dump
 
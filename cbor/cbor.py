@@ -4,17 +4,12 @@
 import datetime
 import re
 import struct
-import sys
 
-_IS_PY3 = sys.version_info[0] >= 3
-
-if _IS_PY3:
-    from io import BytesIO as StringIO
-else:
-    try:
-        from cStringIO import StringIO
-    except:
-        from StringIO import StringIO
+try:
+    # optional, used to vectorize homogeneous numeric arrays
+    import numpy
+except ImportError:
+    numpy = None
 
 CBOR_TYPE_MASK = 0xE0  # top 3 bits
 CBOR_INFO_BITS = 0x1F  # low 5 bits
@@ -63,184 +58,356 @@ CBOR_TAG_REGEX = 35
 CBOR_TAG_MIME = 36  # following text is MIME message, headers, separators and all
 CBOR_TAG_CBOR_FILEHEADER = 55799  # can open a file with 0xd9d9f7
 
-_CBOR_TAG_BIGNUM_BYTES = struct.pack('B', CBOR_TAG | CBOR_TAG_BIGNUM)
+# precompiled Struct objects so the hot paths skip struct's
+# format-string parsing on every pack/unpack
+_S_B = struct.Struct('B')
+_S_BB = struct.Struct('BB')
+_S_BH = struct.Struct('!BH')
+_S_BI = struct.Struct('!BI')
+_S_BQ = struct.Struct('!BQ')
+_S_Bd = struct.Struct('!Bd')
+_S_H = struct.Struct('!H')
+_S_I = struct.Struct('!I')
+_S_Q = struct.Struct('!Q')
+_S_f = struct.Struct('!f')
+_S_d = struct.Struct('!d')
+
+_CBOR_TAG_BIGNUM_BYTES = _S_B.pack(CBOR_TAG | CBOR_TAG_BIGNUM)
+
+# aux header packers indexed by the byte count of the value,
+# n = (val.bit_length() + 7) >> 3; 3-byte values ride the 4-byte
+# encoding and 5..7-byte values the 8-byte one
+_AUX_PACK = (None,
+             _S_BB.pack, _S_BH.pack, _S_BI.pack, _S_BI.pack,
+             _S_BQ.pack, _S_BQ.pack, _S_BQ.pack, _S_BQ.pack)
+_AUX_FOLLOWS = (None,
+                CBOR_UINT8_FOLLOWS, CBOR_UINT16_FOLLOWS,
+                CBOR_UINT32_FOLLOWS, CBOR_UINT32_FOLLOWS,
+                CBOR_UINT64_FOLLOWS, CBOR_UINT64_FOLLOWS,
+                CBOR_UINT64_FOLLOWS, CBOR_UINT64_FOLLOWS)
+
+
+def _compute_short_header(cbor_type, val):
+    if val <= 23:
+        return _S_B.pack(cbor_type | val)
+    return _S_BB.pack(cbor_type | CBOR_UINT8_FOLLOWS, val)
+
 
+# fully-encoded headers for every (major type, aux < 256) pair; nearly
+# all real-world tokens (short strings, small containers, small ints)
+# resolve to one of these 2048 entries
+_SHORT_HDR = dict(
+    (t, tuple(_compute_short_header(t, v) for v in range(256)))
+    for t in (CBOR_UINT, CBOR_NEGINT, CBOR_BYTES, CBOR_TEXT,
+              CBOR_ARRAY, CBOR_MAP, CBOR_TAG, CBOR_7))
+_SHORT_HDR_UINT = _SHORT_HDR[CBOR_UINT]
 
-def dumps_int(val):
-    "return bytes representing int val in CBOR"
+
+def _dumps_int_into(buf, val, _aux_pack=_AUX_PACK, _aux_follows=_AUX_FOLLOWS,
+                    _short_hdr_uint=_SHORT_HDR_UINT):
+    "append bytes representing int val in CBOR to bytearray buf"
     if val >= 0:
         # CBOR_UINT is 0, so I'm lazy/efficient about not OR-ing it in.
         if val <= 23:
-            return struct.pack('B', val)
-        if val <= 0x0ff:
-            return struct.pack('BB', CBOR_UINT8_FOLLOWS, val)
-        if val <= 0x0ffff:
-            return struct.pack('!BH', CBOR_UINT16_FOLLOWS, val)
-        if val <= 0x0ffffffff:
-            return struct.pack('!BI', CBOR_UINT32_FOLLOWS, val)
-        if val <= 0x0ffffffffffffffff:
-            return struct.pack('!BQ', CBOR_UINT64_FOLLOWS, val)
+            buf.append(val)
+            return
+        if val < 256:
+            buf.extend(_short_hdr_uint[val])
+            return
+        n = (val.bit_length() + 7) >> 3
+        if n <= 8:
+            buf.extend(_aux_pack[n](_aux_follows[n], val))
+            return
         outb = _dumps_bignum_to_bytearray(val)
-        return _CBOR_TAG_BIGNUM_BYTES + _encode_type_num(CBOR_BYTES, len(outb)) + outb
+        buf.extend(_CBOR_TAG_BIGNUM_BYTES)
+        _encode_type_num_into(buf, CBOR_BYTES, len(outb))
+        buf.extend(outb)
+        return
     val = -1 - val
-    return _encode_type_num(CBOR_NEGINT, val)
+    _encode_type_num_into(buf, CBOR_NEGINT, val)
 
 
-if _IS_PY3:
-    def _dumps_bignum_to_bytearray(val):
-        out = []
-        while val > 0:
-            out.insert(0, val & 0x0ff)
-            val = val >> 8
-        return bytes(out)
-else:
-    def _dumps_bignum_to_bytearray(val):
-        out = []
-        while val > 0:
-            out.insert(0, chr(val & 0x0ff))
-            val = val >> 8
-        return b''.join(out)
+def _dumps_bignum_to_bytearray(val):
+    return val.to_bytes((val.bit_length() + 7) // 8, 'big')
 
 
-def dumps_float(val):
-    return struct.pack("!Bd", CBOR_FLOAT64, val)
+def _dumps_float_into(buf, val):
+    # emit the 5-byte FLOAT32 form when the value round-trips through
+    # single precision exactly; anything lossy (including NaN, whose
+    # payload we don't inspect) stays in the 9-byte FLOAT64 form
+    try:
+        f32 = _S_f.pack(val)
+    except OverflowError:
+        buf.extend(_S_Bd.pack(CBOR_FLOAT64, val))
+        return
+    if _S_f.unpack(f32)[0] == val:
+        buf.append(CBOR_FLOAT32)
+        buf.extend(f32)
+    else:
+        buf.extend(_S_Bd.pack(CBOR_FLOAT64, val))
 
 
-_CBOR_TAG_NEGBIGNUM_BYTES = struct.pack('B', CBOR_TAG | CBOR_TAG_NEGBIGNUM)
+_CBOR_TAG_NEGBIGNUM_BYTES = _S_B.pack(CBOR_TAG | CBOR_TAG_NEGBIGNUM)
 
 
-def _encode_type_num(cbor_type, val):
-    """For some CBOR primary type [0..7] and an auxiliary unsigned number, return CBOR encoded bytes"""
-    assert val >= 0
+def _encode_type_num_into(buf, cbor_type, val, _aux_pack=_AUX_PACK, _aux_follows=_AUX_FOLLOWS,
+                          _short_hdr=_SHORT_HDR):
+    """For some CBOR primary type [0..7] and an auxiliary unsigned number, append CBOR encoded bytes to buf"""
     if val <= 23:
-        return struct.pack('B', cbor_type | val)
-    if val <= 0x0ff:
-        return struct.pack('BB', cbor_type | CBOR_UINT8_FOLLOWS, val)
-    if val <= 0x0ffff:
-        return struct.pack('!BH', cbor_type | CBOR_UINT16_FOLLOWS, val)
-    if val <= 0x0ffffffff:
-        return struct.pack('!BI', cbor_type | CBOR_UINT32_FOLLOWS, val)
-    if (((cbor_type == CBOR_NEGINT) and (val <= 0x07fffffffffffffff)) or
-            ((cbor_type != CBOR_NEGINT) and (val <= 0x0ffffffffffffffff))):
-        return struct.pack('!BQ', cbor_type | CBOR_UINT64_FOLLOWS, val)
+        buf.append(cbor_type | val)
+        return
+    if val < 256:
+        buf.extend(_short_hdr[cbor_type][val])
+        return
+    n = (val.bit_length() + 7) >> 3
+    if n <= 8:
+        if (cbor_type != CBOR_NEGINT) or (val <= 0x07fffffffffffffff):
+            buf.extend(_aux_pack[n](cbor_type | _aux_follows[n], val))
+            return
     if cbor_type != CBOR_NEGINT:
         raise Exception("value too big for CBOR unsigned number: {0!r}".format(val))
     outb = _dumps_bignum_to_bytearray(val)
-    return _CBOR_TAG_NEGBIGNUM_BYTES + _encode_type_num(CBOR_BYTES, len(outb)) + outb
-
+    buf.extend(_CBOR_TAG_NEGBIGNUM_BYTES)
+    _encode_type_num_into(buf, CBOR_BYTES, len(outb))
+    buf.extend(outb)
 
-if _IS_PY3:
-    def _is_unicode(val):
-        return isinstance(val, str)
-else:
-    def _is_unicode(val):
-        return isinstance(val, unicode)
 
-
-def dumps_string(val, is_text=None, is_bytes=None):
-    if _is_unicode(val):
+def _dumps_string_into(buf, val, is_text=None, is_bytes=None):
+    if isinstance(val, str):
         val = val.encode('utf8')
         is_text = True
         is_bytes = False
     if (is_bytes) or not (is_text == True):
-        return _encode_type_num(CBOR_BYTES, len(val)) + val
-    return _encode_type_num(CBOR_TEXT, len(val)) + val
-
-
-def dumps_array(arr, sort_keys=False):
-    head = _encode_type_num(CBOR_ARRAY, len(arr))
-    parts = [dumps(x, sort_keys=sort_keys) for x in arr]
-    return head + b''.join(parts)
+        _encode_type_num_into(buf, CBOR_BYTES, len(val))
+    else:
+        _encode_type_num_into(buf, CBOR_TEXT, len(val))
+    buf.extend(val)
+
+
+# below this many elements the setup cost of the vectorized array
+# paths outweighs the per-element savings
+_VECTOR_MIN = 16
+
+
+def _dumps_homogeneous_into(buf, arr):
+    """Vectorized encode of an all-float or all-int array body via numpy.
+
+    Only fires when every element lands in one minimal size class, so
+    the output is byte-identical to the per-element encoder. Returns
+    True if it wrote the body, False to fall back."""
+    first = type(arr[0])
+    if first is float:
+        for x in arr:
+            if type(x) is not float:
+                return False
+        f64 = numpy.asarray(arr, dtype='>f8')
+        with numpy.errstate(over='ignore'):
+            f32 = f64.astype('>f4')
+            lossless = f32.astype('>f8') == f64
+        if lossless.all():
+            out = numpy.empty((len(arr), 5), dtype=numpy.uint8)
+            out[:, 0] = CBOR_FLOAT32
+            out[:, 1:] = f32.view(numpy.uint8).reshape(-1, 4)
+        elif not lossless.any():
+            out = numpy.empty((len(arr), 9), dtype=numpy.uint8)
+            out[:, 0] = CBOR_FLOAT64
+            out[:, 1:] = f64.view(numpy.uint8).reshape(-1, 8)
+        else:
+            # mixed widths; the per-element encoder picks per value
+            return False
+        buf.extend(out.tobytes())
+        return True
+    if first is int:
+        for x in arr:
+            if type(x) is not int:
+                return False
+        lo = min(arr)
+        if lo < 0:
+            return False
+        hi = max(arr)
+        if hi <= 23:
+            buf.extend(numpy.asarray(arr, dtype=numpy.uint8).tobytes())
+            return True
+        if lo >= 24 and hi <= 0xff:
+            out = numpy.empty((len(arr), 2), dtype=numpy.uint8)
+            out[:, 0] = CBOR_UINT8_FOLLOWS
+            out[:, 1] = numpy.asarray(arr, dtype=numpy.uint8)
+            buf.extend(out.tobytes())
+            return True
+        if lo >= 0x100 and hi <= 0xffff:
+            out = numpy.empty((len(arr), 3), dtype=numpy.uint8)
+            out[:, 0] = CBOR_UINT16_FOLLOWS
+            out[:, 1:] = numpy.asarray(arr, dtype='>u2').view(numpy.uint8).reshape(-1, 2)
+            buf.extend(out.tobytes())
+            return True
+        if lo >= 0x10000 and hi <= 0xffffffff:
+            out = numpy.empty((len(arr), 5), dtype=numpy.uint8)
+            out[:, 0] = CBOR_UINT32_FOLLOWS
+            out[:, 1:] = numpy.asarray(arr, dtype='>u4').view(numpy.uint8).reshape(-1, 4)
+            buf.extend(out.tobytes())
+            return True
+    return False
+
+
+def _dumps_array_into(buf, arr, sort_keys=False):
+    _encode_type_num_into(buf, CBOR_ARRAY, len(arr))
+    if numpy is not None and len(arr) >= _VECTOR_MIN:
+        if _dumps_homogeneous_into(buf, arr):
+            return
+    for x in arr:
+        _dumps_into(buf, x, sort_keys=sort_keys)
+
+
+def _dumps_var_array_into(buf, arr, sort_keys=False):
+    buf.append(CBOR_ARRAY | CBOR_VAR_FOLLOWS)
+    for x in arr:
+        _dumps_into(buf, x, sort_keys=sort_keys)
+    buf.append(CBOR_BREAK)
+
+
+# memoized encodings of short text map keys; the same schema-ish keys
+# recur across records, so repeat encodes become one dict hit
+_KEY_CACHE = {}
+_KEY_CACHE_MAX = 1024
+_KEY_CACHE_MAX_LEN = 64
+
+
+def _dumps_dict_key_into(buf, k, sort_keys, _cache=_KEY_CACHE):
+    # only exact str keys are cached: caching by value for int-ish keys
+    # would let 1, 1.0 and True collide on the same dict slot
+    if type(k) is str:
+        enc = _cache.get(k)
+        if enc is not None:
+            buf.extend(enc)
+            return
+        if len(k) < _KEY_CACHE_MAX_LEN and len(_cache) < _KEY_CACHE_MAX:
+            kb = bytearray()
+            _dumps_string_into(kb, k)
+            enc = bytes(kb)
+            _cache[k] = enc
+            buf.extend(enc)
+            return
+    _dumps_into(buf, k, sort_keys=sort_keys)
+
+
+def _dumps_dict_into(buf, d, sort_keys=False):
+    _encode_type_num_into(buf, CBOR_MAP, len(d))
+    if sort_keys:
+        for k in sorted(d.keys()):
+            _dumps_dict_key_into(buf, k, sort_keys)
+            _dumps_into(buf, d[k], sort_keys=sort_keys)
+    else:
+        for k, v in d.items():
+            _dumps_dict_key_into(buf, k, sort_keys)
+            _dumps_into(buf, v, sort_keys=sort_keys)
 
 
-def dumps_var_array(arr, sort_keys=False):
-    head = struct.pack('B', CBOR_ARRAY | CBOR_VAR_FOLLOWS)
-    parts = [dumps(x, sort_keys=sort_keys) for x in arr]
-    return head + b''.join(parts) + bytes([CBOR_BREAK])
+def _dumps_bool_into(buf, b):
+    if b:
+        buf.append(CBOR_TRUE)
+    else:
+        buf.append(CBOR_FALSE)
 
 
-if _IS_PY3:
-    def dumps_dict(d, sort_keys=False):
-        head = _encode_type_num(CBOR_MAP, len(d))
-        parts = [head]
-        if sort_keys:
-            for k in sorted(d.keys()):
-                v = d[k]
-                parts.append(dumps(k, sort_keys=sort_keys))
-                parts.append(dumps(v, sort_keys=sort_keys))
-        else:
-            for k, v in d.items():
-                parts.append(dumps(k, sort_keys=sort_keys))
-                parts.append(dumps(v, sort_keys=sort_keys))
-        return b''.join(parts)
-else:
-    def dumps_dict(d, sort_keys=False):
-        head = _encode_type_num(CBOR_MAP, len(d))
-        parts = [head]
-        if sort_keys:
-            for k in sorted(d.iterkeys()):
-                v = d[k]
-                parts.append(dumps(k, sort_keys=sort_keys))
-                parts.append(dumps(v, sort_keys=sort_keys))
-        else:
-            for k, v in d.iteritems():
-                parts.append(dumps(k, sort_keys=sort_keys))
-                parts.append(dumps(v, sort_keys=sort_keys))
-        return b''.join(parts)
+def _dumps_tag_into(buf, t, sort_keys=False):
+    _encode_type_num_into(buf, CBOR_TAG, t.tag)
+    _dumps_into(buf, t.value, sort_keys=sort_keys)
 
 
-def dumps_bool(b):
-    if b:
-        return struct.pack('B', CBOR_TRUE)
-    return struct.pack('B', CBOR_FALSE)
+class VarList(list):
+    def __repr__(self):
+        return 'VarList(%s)' % list.__repr__(self)
 
 
-def dumps_tag(t, sort_keys=False):
-    return _encode_type_num(CBOR_TAG, t.tag) + dumps(t.value, sort_keys=sort_keys)
+def _build_exact_dispatch():
+    """Encoder dispatch keyed on exact type.
 
+    One dict lookup on type(ob) replaces the isinstance ladder for the
+    common built-ins. Entries share the (buf, ob, sort_keys) shape so
+    the caller needs no per-type knowledge; subclasses (and VarList and
+    Tag, which are subclasses of list and object) miss the table and
+    fall through to the ladder, which still honors them."""
+    def none_into(buf, ob, sort_keys):
+        buf.append(CBOR_NULL)
 
-if _IS_PY3:
-    def _is_stringish(x):
-        return isinstance(x, (str, bytes))
+    def bool_into(buf, ob, sort_keys):
+        _dumps_bool_into(buf, ob)
 
+    def int_into(buf, ob, sort_keys):
+        _dumps_int_into(buf, ob)
 
-    def _is_intish(x):
-        return isinstance(x, int)
-else:
-    def _is_stringish(x):
-        return isinstance(x, (str, basestring, bytes, unicode))
+    def float_into(buf, ob, sort_keys):
+        _dumps_float_into(buf, ob)
 
+    def string_into(buf, ob, sort_keys):
+        _dumps_string_into(buf, ob)
 
-    def _is_intish(x):
-        return isinstance(x, (int, long))
+    return {
+        type(None): none_into,
+        bool: bool_into,
+        int: int_into,
+        float: float_into,
+        str: string_into,
+        bytes: string_into,
+        list: _dumps_array_into,
+        tuple: _dumps_array_into,
+        dict: _dumps_dict_into,
+    }
 
 
-class VarList(list):
-    def __repr__(self):
-        return 'VarList(%s)' % list.__repr__(self)
+_EXACT_DISPATCH = _build_exact_dispatch()
 
 
-def dumps(ob, sort_keys=False):
+def _dumps_into(buf, ob, sort_keys=False, _exact_get=_EXACT_DISPATCH.get):
+    "append the CBOR encoding of ob to bytearray buf"
+    f = _exact_get(type(ob))
+    if f is not None:
+        f(buf, ob, sort_keys)
+        return
+    # exact-type miss: subclasses, VarList, Tag
     if ob is None:
-        return struct.pack('B', CBOR_NULL)
+        buf.append(CBOR_NULL)
+        return
     if isinstance(ob, bool):
-        return dumps_bool(ob)
-    if _is_stringish(ob):
-        return dumps_string(ob)
+        _dumps_bool_into(buf, ob)
+        return
+    if isinstance(ob, int):
+        _dumps_int_into(buf, ob)
+        return
+    if isinstance(ob, (str, bytes)):
+        _dumps_string_into(buf, ob)
+        return
     if isinstance(ob, VarList):
-        return dumps_var_array(ob, sort_keys=sort_keys)
+        _dumps_var_array_into(buf, ob, sort_keys=sort_keys)
+        return
     if isinstance(ob, (list, tuple)):
-        return dumps_array(ob, sort_keys=sort_keys)
+        _dumps_array_into(buf, ob, sort_keys=sort_keys)
+        return
     # TODO: accept other enumerables and emit a variable length array
     if isinstance(ob, dict):
-        return dumps_dict(ob, sort_keys=sort_keys)
+        _dumps_dict_into(buf, ob, sort_keys=sort_keys)
+        return
     if isinstance(ob, float):
-        return dumps_float(ob)
-    if _is_intish(ob):
-        return dumps_int(ob)
+        _dumps_float_into(buf, ob)
+        return
     if isinstance(ob, Tag):
-        return dumps_tag(ob, sort_keys=sort_keys)
-    raise Exception("don't know how to cbor serialize object of type %s", type(ob))
+        _dumps_tag_into(buf, ob, sort_keys=sort_keys)
+        return
+    raise ValueError("don't know how to cbor serialize object of type %s" % (type(ob),))
+
+
+def dumps(ob, sort_keys=False):
+    # Note: no capacity reservation here. CPython has no bytearray
+    # reserve(), and the bytearray(n); del buf[:] trick frees the
+    # allocation again, so a size estimate would buy nothing; amortized
+    # growth on extend() is what keeps regrowth copies cheap.
+    buf = bytearray()
+    _dumps_into(buf, ob, sort_keys=sort_keys)
+    return bytes(buf)
+
+
+# flush dump()'s buffer to the file once it grows past this many bytes
+_DUMP_FLUSH = 65536
 
 
 # same basic signature as json.dump, but with no options (yet)
@@ -249,10 +416,29 @@ def dump(obj, fp, sort_keys=False):
     obj: Python object to serialize
     fp: file-like object capable of .write(bytes)
     """
-    # this is kinda lame, but probably not inefficient for non-huge objects
-    # TODO: .write() to fp as we go as each inner object is serialized
-    blob = dumps(obj, sort_keys=sort_keys)
-    fp.write(blob)
+    buf = bytearray()
+    if isinstance(obj, (list, tuple)) and not isinstance(obj, VarList):
+        # stream top-level containers element by element so peak memory
+        # stays near _DUMP_FLUSH instead of the full serialized size
+        _encode_type_num_into(buf, CBOR_ARRAY, len(obj))
+        for x in obj:
+            _dumps_into(buf, x, sort_keys=sort_keys)
+            if len(buf) >= _DUMP_FLUSH:
+                fp.write(bytes(buf))
+                del buf[:]
+    elif isinstance(obj, dict):
+        _encode_type_num_into(buf, CBOR_MAP, len(obj))
+        keys = sorted(obj.keys()) if sort_keys else obj.keys()
+        for k in keys:
+            _dumps_into(buf, k, sort_keys=sort_keys)
+            _dumps_into(buf, obj[k], sort_keys=sort_keys)
+            if len(buf) >= _DUMP_FLUSH:
+                fp.write(bytes(buf))
+                del buf[:]
+    else:
+        _dumps_into(buf, obj, sort_keys=sort_keys)
+    if buf:
+        fp.write(bytes(buf))
 
 
 class Tag(object):
@@ -275,8 +461,10 @@ def loads(data):
     """
     if data is None:
         raise ValueError("got None for buffer to decode in loads")
-    fp = StringIO(data)
-    return _loads(fp)[0]
+    try:
+        return _Parser(memoryview(data)).parse()
+    except IndexError:
+        raise EOFError()
 
 
 def load(fp):
@@ -289,33 +477,26 @@ def load(fp):
 _MAX_DEPTH = 100
 
 
-def _tag_aux(fp, tb):
-    bytes_read = 1
+# (size, unpack) for the sized aux encodings, indexed by
+# tag_aux - CBOR_UINT16_FOLLOWS; the one-byte case is a direct read
+_AUX_UNPACK = ((2, _S_H.unpack_from), (4, _S_I.unpack_from), (8, _S_Q.unpack_from))
+
+
+def _tag_aux(fp, tb, _aux_unpack=_AUX_UNPACK):
     tag = tb & CBOR_TYPE_MASK
     tag_aux = tb & CBOR_INFO_BITS
     if tag_aux <= 23:
-        aux = tag_aux
-    elif tag_aux == CBOR_UINT8_FOLLOWS:
+        return tag, tag_aux, tag_aux, 1
+    if tag_aux == CBOR_UINT8_FOLLOWS:
         data = fp.read(1)
-        aux = struct.unpack_from("!B", data, 0)[0]
-        bytes_read += 1
-    elif tag_aux == CBOR_UINT16_FOLLOWS:
-        data = fp.read(2)
-        aux = struct.unpack_from("!H", data, 0)[0]
-        bytes_read += 2
-    elif tag_aux == CBOR_UINT32_FOLLOWS:
-        data = fp.read(4)
-        aux = struct.unpack_from("!I", data, 0)[0]
-        bytes_read += 4
-    elif tag_aux == CBOR_UINT64_FOLLOWS:
-        data = fp.read(8)
-        aux = struct.unpack_from("!Q", data, 0)[0]
-        bytes_read += 8
-    else:
-        assert tag_aux == CBOR_VAR_FOLLOWS, "bogus tag {0:02x}".format(tb)
-        aux = None
-
-    return tag, tag_aux, aux, bytes_read
+        aux = data[0]
+        return tag, tag_aux, aux, 2
+    if tag_aux <= CBOR_UINT64_FOLLOWS:
+        size, unpack = _aux_unpack[tag_aux - CBOR_UINT16_FOLLOWS]
+        return tag, tag_aux, unpack(fp.read(size), 0)[0], 1 + size
+    if tag_aux != CBOR_VAR_FOLLOWS:
+        raise ValueError("bogus tag %02x" % tb)
+    return tag, tag_aux, None, 1
 
 
 def _read_byte(fp):
@@ -350,44 +531,24 @@ def _loads_var_map(fp, limit, depth, returntags, bytes_read):
     return (ob, bytes_read + 1)
 
 
-if _IS_PY3:
-    def _loads_array(fp, limit, depth, returntags, aux, bytes_read):
-        ob = []
-        for i in range(aux):
-            subob, subpos = _loads(fp)
-            bytes_read += subpos
-            ob.append(subob)
-        return ob, bytes_read
-
-
-    def _loads_map(fp, limit, depth, returntags, aux, bytes_read):
-        ob = {}
-        for i in range(aux):
-            subk, subpos = _loads(fp)
-            bytes_read += subpos
-            subv, subpos = _loads(fp)
-            bytes_read += subpos
-            ob[subk] = subv
-        return ob, bytes_read
-else:
-    def _loads_array(fp, limit, depth, returntags, aux, bytes_read):
-        ob = []
-        for i in xrange(aux):
-            subob, subpos = _loads(fp)
-            bytes_read += subpos
-            ob.append(subob)
-        return ob, bytes_read
+def _loads_array(fp, limit, depth, returntags, aux, bytes_read):
+    ob = []
+    for i in range(aux):
+        subob, subpos = _loads(fp)
+        bytes_read += subpos
+        ob.append(subob)
+    return ob, bytes_read
 
 
-    def _loads_map(fp, limit, depth, returntags, aux, bytes_read):
-        ob = {}
-        for i in xrange(aux):
-            subk, subpos = _loads(fp)
-            bytes_read += subpos
-            subv, subpos = _loads(fp)
-            bytes_read += subpos
-            ob[subk] = subv
-        return ob, bytes_read
+def _loads_map(fp, limit, depth, returntags, aux, bytes_read):
+    ob = {}
+    for i in range(aux):
+        subk, subpos = _loads(fp)
+        bytes_read += subpos
+        subv, subpos = _loads(fp)
+        bytes_read += subpos
+        ob[subk] = subv
+    return ob, bytes_read
 
 
 def _loads(fp, limit=None, depth=0, returntags=False):
@@ -404,7 +565,7 @@ def _loads_tb(fp, tb, limit=None, depth=0, returntags=False):
     # Some special cases of CBOR_7 best handled by special struct.unpack logic here
     if tb == CBOR_FLOAT16:
         data = fp.read(2)
-        hibyte, lowbyte = struct.unpack_from("BB", data, 0)
+        hibyte, lowbyte = _S_BB.unpack_from(data, 0)
         exp = (hibyte >> 2) & 0x1F
         mant = ((hibyte & 0x03) << 8) | lowbyte
         if exp == 0:
@@ -421,11 +582,11 @@ def _loads_tb(fp, tb, limit=None, depth=0, returntags=False):
         return (val, 3)
     elif tb == CBOR_FLOAT32:
         data = fp.read(4)
-        pf = struct.unpack_from("!f", data, 0)
+        pf = _S_f.unpack_from(data, 0)
         return (pf[0], 5)
     elif tb == CBOR_FLOAT64:
         data = fp.read(8)
-        pf = struct.unpack_from("!d", data, 0)
+        pf = _S_d.unpack_from(data, 0)
         return (pf[0], 9)
 
     tag, tag_aux, aux, bytes_read = _tag_aux(fp, tb)
@@ -468,7 +629,7 @@ def _loads_tb(fp, tb, limit=None, depth=0, returntags=False):
             return (None, bytes_read)
         if tb == CBOR_UNDEFINED:
             return (None, bytes_read)
-        raise ValueError("unknown cbor tag 7 byte: {:02x}".format(tb))
+        raise ValueError("unknown cbor tag 7 byte: %02x" % tb)
 
 
 def loads_bytes(fp, aux, btag=CBOR_BYTES):
@@ -482,33 +643,431 @@ def loads_bytes(fp, aux, btag=CBOR_BYTES):
     total_bytes_read = 0
     while True:
         tb = fp.read(1)[0]
-        if not _IS_PY3:
-            tb = ord(tb)
         if tb == CBOR_BREAK:
             total_bytes_read += 1
             break
         tag, tag_aux, aux, bytes_read = _tag_aux(fp, tb)
-        assert tag == btag, 'variable length value contains unexpected component'
+        if tag != btag:
+            raise ValueError('variable length value contains unexpected component')
         ob = fp.read(aux)
         chunklist.append(ob)
         total_bytes_read += bytes_read + aux
     return (b''.join(chunklist), total_bytes_read)
 
 
-if _IS_PY3:
-    def _bytes_to_biguint(bs):
-        out = 0
-        for ch in bs:
-            out = out << 8
-            out = out | ch
-        return out
-else:
-    def _bytes_to_biguint(bs):
-        out = 0
-        for ch in bs:
-            out = out << 8
-            out = out | ord(ch)
-        return out
+# Buffer-oriented twin of the fp-based decoder above. loads() wraps its
+# input in a memoryview once and indexes into it, so header reads return
+# plain ints and byte/text payloads are the only copies made.
+
+def _tag_aux_buf(data, offset, _aux_unpack=_AUX_UNPACK):
+    tb = data[offset]
+    tag = tb & CBOR_TYPE_MASK
+    tag_aux = tb & CBOR_INFO_BITS
+    if tag_aux <= 23:
+        return tag, tag_aux, tag_aux, 1
+    if tag_aux == CBOR_UINT8_FOLLOWS:
+        return tag, tag_aux, data[offset + 1], 2
+    if tag_aux <= CBOR_UINT64_FOLLOWS:
+        size, unpack = _aux_unpack[tag_aux - CBOR_UINT16_FOLLOWS]
+        return tag, tag_aux, unpack(data, offset + 1)[0], 1 + size
+    if tag_aux != CBOR_VAR_FOLLOWS:
+        raise ValueError("bogus tag %02x" % tb)
+    return tag, tag_aux, None, 1
+
+
+# markers threaded between the dispatch handlers and the parse loop:
+# _OPEN means "a container frame was pushed, keep reading tokens",
+# _BREAK is an encountered 0xff stop byte, _NO_KEY an empty map key slot
+_OPEN = object()
+_BREAK = object()
+_NO_KEY = object()
+
+# work-stack frame kinds
+_K_ARRAY = 0
+_K_VAR_ARRAY = 1
+_K_MAP = 2
+_K_VAR_MAP = 3
+_K_TAG = 4
+
+
+class _Parser(object):
+    """Decode one CBOR object from an in-memory buffer.
+
+    The read position is parser state, so the dispatch handlers return
+    bare objects instead of (object, bytes_read) tuples, and containers
+    are assembled on an explicit frame stack rather than by recursion,
+    so nesting depth costs a small list entry instead of an interpreter
+    frame."""
+    __slots__ = ('data', 'off', 'returntags', 'stack')
+
+    def __init__(self, data, offset=0, returntags=False):
+        self.data = data
+        self.off = offset
+        self.returntags = returntags
+        self.stack = []
+
+    def _var_bytes(self, btag):
+        # TODO: limit to some maximum number of chunks and some maximum total bytes
+        data = self.data
+        off = self.off
+        chunklist = []
+        while True:
+            tb = data[off]
+            if tb == CBOR_BREAK:
+                off += 1
+                break
+            tag, tag_aux, aux, bytes_read = _tag_aux_buf(data, off)
+            if tag != btag:
+                raise ValueError('variable length value contains unexpected component')
+            off += bytes_read
+            chunklist.append(bytes(data[off:off + aux]))
+            off += aux
+        self.off = off
+        return b''.join(chunklist)
+
+    def parse(self):
+        data = self.data
+        dispatch = _DISPATCH
+        stack = self.stack
+        while True:
+            off = self.off
+            self.off = off + 1
+            ob = dispatch[data[off]](self)
+            if ob is _OPEN:
+                # a container frame was pushed; read its first member
+                continue
+            # deliver ob into enclosing frames; completing a frame
+            # delivers the finished container one level further up
+            while True:
+                if ob is _BREAK:
+                    if not stack:
+                        raise ValueError("unknown cbor tag 7 byte: ff")
+                    f = stack.pop()
+                    kind = f[0]
+                    if kind == _K_VAR_ARRAY or (kind == _K_VAR_MAP and f[3] is _NO_KEY):
+                        ob = f[1]
+                        continue
+                    raise ValueError("break terminated a definite-length item")
+                if not stack:
+                    return ob
+                f = stack[-1]
+                kind = f[0]
+                if kind == _K_ARRAY:
+                    f[1].append(ob)
+                    f[2] -= 1
+                    if f[2]:
+                        break
+                    stack.pop()
+                    ob = f[1]
+                    continue
+                if kind == _K_VAR_ARRAY:
+                    f[1].append(ob)
+                    break
+                if kind == _K_MAP or kind == _K_VAR_MAP:
+                    if f[3] is _NO_KEY:
+                        f[3] = ob
+                        break
+                    f[1][f[3]] = ob
+                    f[3] = _NO_KEY
+                    if kind == _K_MAP:
+                        f[2] -= 1
+                        if f[2] == 0:
+                            stack.pop()
+                            ob = f[1]
+                            continue
+                    break
+                # _K_TAG
+                stack.pop()
+                if self.returntags:
+                    # Don't interpret the tag, return it and the tagged object.
+                    ob = Tag(f[1], ob)
+                else:
+                    # attempt to interpet the tag and the value into a Python object.
+                    ob = tagify(ob, f[1])
+                continue
+
+
+# (header width, element dtype) per leading tag byte for bulk array
+# decode; big-endian dtypes so numpy does the byteswap in one pass
+_BULK_DTYPES = {
+    CBOR_UINT8_FOLLOWS: (2, 'u1'),
+    CBOR_UINT16_FOLLOWS: (3, '>u2'),
+    CBOR_UINT32_FOLLOWS: (5, '>u4'),
+    CBOR_UINT64_FOLLOWS: (9, '>u8'),
+    CBOR_FLOAT32: (5, '>f4'),
+    CBOR_FLOAT64: (9, '>f8'),
+}
+
+
+def _parse_uniform_array(p, n):
+    """Bulk-decode a fixed array whose n elements all carry the same
+    single-byte tag (or are all small-int literals), one frombuffer
+    over the block instead of n dispatched parse calls. Returns the
+    decoded list, or None to fall back to the per-element loop."""
+    data = p.data
+    off = p.off
+    tb = data[off]
+    if tb <= 23:
+        end = off + n
+        if end > len(data):
+            return None
+        chunk = numpy.frombuffer(data[off:end], numpy.uint8)
+        if not (chunk <= 23).all():
+            return None
+        p.off = end
+        return chunk.tolist()
+    wd = _BULK_DTYPES.get(tb)
+    if wd is None:
+        return None
+    end = off + n * wd[0]
+    if end > len(data):
+        return None
+    block = numpy.frombuffer(data[off:end], dtype=[('tag', 'u1'), ('val', wd[1])])
+    if not (block['tag'] == tb).all():
+        return None
+    p.off = end
+    return block['val'].tolist()
+
+
+def _parse_fixed_array(p, n):
+    if n == 0:
+        return []
+    if numpy is not None and n >= _VECTOR_MIN:
+        ob = _parse_uniform_array(p, n)
+        if ob is not None:
+            return ob
+    p.stack.append([_K_ARRAY, [], n, None])
+    return _OPEN
+
+
+def _parse_fixed_map(p, n):
+    if n == 0:
+        return {}
+    p.stack.append([_K_MAP, {}, n, _NO_KEY])
+    return _OPEN
+
+
+def _parse_tagged(p, tagnum):
+    p.stack.append([_K_TAG, tagnum, 1, None])
+    return _OPEN
+
+
+def _d_var_array(p):
+    p.stack.append([_K_VAR_ARRAY, VarList(), None, None])
+    return _OPEN
+
+
+def _d_var_map(p):
+    p.stack.append([_K_VAR_MAP, {}, None, _NO_KEY])
+    return _OPEN
+
+
+def _d_break(p):
+    return _BREAK
+
+
+def _d_float16(p):
+    data = p.data
+    off = p.off
+    hibyte = data[off]
+    lowbyte = data[off + 1]
+    exp = (hibyte >> 2) & 0x1F
+    mant = ((hibyte & 0x03) << 8) | lowbyte
+    if exp == 0:
+        val = mant * (2.0 ** -24)
+    elif exp == 31:
+        if mant == 0:
+            val = float('Inf')
+        else:
+            val = float('NaN')
+    else:
+        val = (mant + 1024.0) * (2 ** (exp - 25))
+    if hibyte & 0x80:
+        val = -1.0 * val
+    p.off = off + 2
+    return val
+
+
+def _d_float32(p):
+    off = p.off
+    p.off = off + 4
+    return _S_f.unpack_from(p.data, off)[0]
+
+
+def _d_float64(p):
+    off = p.off
+    p.off = off + 8
+    return _S_d.unpack_from(p.data, off)[0]
+
+
+# readers for the 1/2/4/8-byte aux encodings; each returns the aux
+# value and advances the parser past it
+def _aux8(p):
+    off = p.off
+    p.off = off + 1
+    return p.data[off]
+
+
+# big-endian shift reads: indexing the memoryview yields ints, and
+# shifting them together skips the 1-tuple Struct.unpack_from allocates
+# just to be indexed with [0]
+def _aux16(p):
+    off = p.off
+    p.off = off + 2
+    data = p.data
+    return (data[off] << 8) | data[off + 1]
+
+
+def _aux32(p):
+    off = p.off
+    p.off = off + 4
+    data = p.data
+    return (data[off] << 24) | (data[off + 1] << 16) | (data[off + 2] << 8) | data[off + 3]
+
+
+def _aux64(p):
+    off = p.off
+    p.off = off + 8
+    data = p.data
+    return ((data[off] << 56) | (data[off + 1] << 48) | (data[off + 2] << 40) |
+            (data[off + 3] << 32) | (data[off + 4] << 24) | (data[off + 5] << 16) |
+            (data[off + 6] << 8) | data[off + 7])
+
+
+_AUX_READ = (_aux8, _aux16, _aux32, _aux64)
+
+
+def _build_dispatch():
+    """One handler per possible first byte, so parse() replaces the
+    header-decode branch chain with a single table lookup."""
+
+    def bogus(tb):
+        def h(p):
+            raise ValueError("bogus tag %02x" % tb)
+        return h
+
+    def unknown7(tb):
+        def h(p):
+            raise ValueError("unknown cbor tag 7 byte: %02x" % tb)
+        return h
+
+    def const(val):
+        def h(p):
+            return val
+        return h
+
+    def uint_aux(read):
+        def h(p):
+            return read(p)
+        return h
+
+    def negint_aux(read):
+        def h(p):
+            return -1 - read(p)
+        return h
+
+    def fixed_bytes(n):
+        def h(p):
+            off = p.off
+            p.off = off + n
+            return bytes(p.data[off:off + n])
+        return h
+
+    def sized_bytes(read):
+        def h(p):
+            n = read(p)
+            off = p.off
+            p.off = off + n
+            return bytes(p.data[off:off + n])
+        return h
+
+    def fixed_text(n):
+        def h(p):
+            off = p.off
+            p.off = off + n
+            return str(p.data[off:off + n], 'utf8')
+        return h
+
+    def sized_text(read):
+        def h(p):
+            n = read(p)
+            off = p.off
+            p.off = off + n
+            return str(p.data[off:off + n], 'utf8')
+        return h
+
+    def fixed_array(n):
+        def h(p):
+            return _parse_fixed_array(p, n)
+        return h
+
+    def sized_array(read):
+        def h(p):
+            return _parse_fixed_array(p, read(p))
+        return h
+
+    def fixed_map(n):
+        def h(p):
+            return _parse_fixed_map(p, n)
+        return h
+
+    def sized_map(read):
+        def h(p):
+            return _parse_fixed_map(p, read(p))
+        return h
+
+    def fixed_tag(tagnum):
+        def h(p):
+            return _parse_tagged(p, tagnum)
+        return h
+
+    def sized_tag(read):
+        def h(p):
+            return _parse_tagged(p, read(p))
+        return h
+
+    d = [None] * 256
+    for tb in range(256):
+        d[tb] = bogus(tb)
+    for n in range(24):
+        d[CBOR_UINT | n] = const(n)
+        d[CBOR_NEGINT | n] = const(-1 - n)
+        d[CBOR_BYTES | n] = fixed_bytes(n)
+        d[CBOR_TEXT | n] = fixed_text(n)
+        d[CBOR_ARRAY | n] = fixed_array(n)
+        d[CBOR_MAP | n] = fixed_map(n)
+        d[CBOR_TAG | n] = fixed_tag(n)
+        d[CBOR_7 | n] = unknown7(CBOR_7 | n)
+    for i, read in enumerate(_AUX_READ):
+        follows = CBOR_UINT8_FOLLOWS + i
+        d[CBOR_UINT | follows] = uint_aux(read)
+        d[CBOR_NEGINT | follows] = negint_aux(read)
+        d[CBOR_BYTES | follows] = sized_bytes(read)
+        d[CBOR_TEXT | follows] = sized_text(read)
+        d[CBOR_ARRAY | follows] = sized_array(read)
+        d[CBOR_MAP | follows] = sized_map(read)
+        d[CBOR_TAG | follows] = sized_tag(read)
+        d[CBOR_7 | follows] = unknown7(CBOR_7 | follows)
+    d[CBOR_BYTES | CBOR_VAR_FOLLOWS] = lambda p: p._var_bytes(CBOR_BYTES)
+    d[CBOR_TEXT | CBOR_VAR_FOLLOWS] = lambda p: p._var_bytes(CBOR_TEXT).decode('utf8')
+    d[CBOR_ARRAY | CBOR_VAR_FOLLOWS] = _d_var_array
+    d[CBOR_MAP | CBOR_VAR_FOLLOWS] = _d_var_map
+    d[CBOR_FALSE] = const(False)
+    d[CBOR_TRUE] = const(True)
+    d[CBOR_NULL] = const(None)
+    d[CBOR_UNDEFINED] = const(None)
+    d[CBOR_FLOAT16] = _d_float16
+    d[CBOR_FLOAT32] = _d_float32
+    d[CBOR_FLOAT64] = _d_float64
+    d[CBOR_BREAK] = _d_break
+    return tuple(d)
+
+
+_DISPATCH = _build_dispatch()
+
+
+def _bytes_to_biguint(bs):
+    return int.from_bytes(bs, 'big')
 
 
 def tagify(ob, aux):
@@ -1,11 +1,11 @@
 try:
     # try C library _cbor.so
     from ._cbor import loads, dumps, load, dump
-except:
+except ImportError:
     # fall back to 100% python implementation
     from .cbor import loads, dumps, load, dump
 
-from .cbor import Tag, CBOR_TAG_CBOR, _IS_PY3
+from .cbor import Tag, CBOR_TAG_CBOR
 
 
 class ClassTag(object):
@@ -51,14 +51,8 @@ class TagMapper(object):
             return [self.encode(x) for x in obj]
         if isinstance(obj, dict):
             # assume key is a primitive
-            # can't do this in Python 2.6:
-            #return {k:self.encode(v) for k,v in obj.iteritems()}
             out = {}
-            if _IS_PY3:
-                items = obj.items()
-            else:
-                items = obj.iteritems()
-            for k,v in items:
+            for k,v in obj.items():
                 out[k] = self.encode(v)
             return out
         # fall through, let underlying cbor.dump decide if it can encode object
@@ -81,11 +75,7 @@ class TagMapper(object):
             return obj
         if isinstance(obj, dict):
             # update in place
-            if _IS_PY3:
-                items = obj.items()
-            else:
-                items = obj.iteritems()
-            for k,v in items:
+            for k,v in obj.items():
                 # assume key is a primitive
                 obj[k] = self.decode(v)
             return obj
@@ -176,6 +176,14 @@ class XTestCBOR(object):
             ob = _randob()
             self._oso(ob)
 
+    def test_homogeneous_arrays(self):
+        # large single-type arrays may take a vectorized fast path;
+        # make sure it round-trips the same as anything else
+        if not self.testable(): return
+        self._oso([x for x in _range(500)])
+        self._oso([random.randint(0, 0xffffffff) for x in _range(500)])
+        self._oso([random.random() for x in _range(500)])
+
     def test_tuple(self):
         if not self.testable(): return
         l = [1,2,3]